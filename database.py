@@ -3,11 +3,16 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+The client is Motor (asyncio), so the helpers are coroutines: ``await`` them
+from async endpoints.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timezone
 import os
+import logging
 from dotenv import load_dotenv
 from typing import Union
 from pydantic import BaseModel
@@ -15,6 +20,8 @@ from pydantic import BaseModel
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
 db = None
 
@@ -22,12 +29,60 @@ database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = AsyncIOMotorClient(database_url, tz_aware=True)
     db = _client[database_name]
 
+async def ensure_indexes():
+    """Seed version counters and create the indexes the API relies on (no-op without a database)"""
+    if db is None:
+        return
+    # Counters are seeded first and independently, so a failed index build
+    # cannot leave new versions restarting at 1
+    try:
+        await seed_version_counters()
+    except Exception:
+        logger.exception("Could not seed version counters")
+
+    versions = db["prototypeversion"]
+    # Unique (idea_id, version) rejects a duplicate version instead of storing it,
+    # and lets version listings walk the index instead of sorting in memory.
+    # It replaces the earlier idea_id_1_version_-1 index, which is only dropped
+    # once the unique build has succeeded.
+    try:
+        await versions.create_index([("idea_id", 1), ("version", 1)], unique=True)
+    except DuplicateKeyError:
+        logger.error(
+            "prototypeversion has duplicate (idea_id, version) pairs; remove them so "
+            "the unique version index can be built. Keeping the non-unique index."
+        )
+        await versions.create_index([("idea_id", 1), ("version", -1)])
+    else:
+        if "idea_id_1_version_-1" in await versions.index_information():
+            await versions.drop_index("idea_id_1_version_-1")
+    await db["idea"].create_index("created_at")
+
+async def seed_version_counters():
+    """One-time migration: raise each idea's version counter to its highest stored version"""
+    if db is None:
+        return
+    if await db["migrations"].find_one({"_id": "seed_version_counters"}):
+        return
+    pipeline = [{"$group": {"_id": "$idea_id", "max_version": {"$max": "$version"}}}]
+    requests = [
+        UpdateOne({"_id": row["_id"]}, {"$max": {"seq": int(row["max_version"])}}, upsert=True)
+        async for row in db["prototypeversion"].aggregate(pipeline)
+    ]
+    if requests:
+        await db["version_counter"].bulk_write(requests, ordered=False)
+    await db["migrations"].update_one(
+        {"_id": "seed_version_counters"},
+        {"$set": {"applied_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp (coroutine: must be awaited)"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
@@ -40,11 +95,11 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+    """Get documents from collection (coroutine: must be awaited)"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
@@ -52,4 +107,4 @@ def get_documents(collection_name: str, filter_dict: dict = None, limit: int = N
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=None)
@@ -1,45 +1,150 @@
 import os
-from datetime import datetime
-from typing import Optional, Literal, List, Dict, Any
-
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import html
+import logging
+import platform
+import re
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Optional, Literal, List, Dict, Any, Callable, Tuple, Type
+
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 
-from database import db, create_document
+from database import db, ensure_indexes
+from schemas import PrototypeVersion
+import msgspec
+import orjson
 from bson import ObjectId
+from pymongo import ReturnDocument
+
+try:
+    import ahocorasick
+except ImportError:  # fall back to per-category regexes below
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Middleware ----------
+
+class FastCORS:
+    """Allow-all CORS with prebuilt header bytes.
+
+    Adds ``Access-Control-Allow-Origin: *`` to every HTTP response and answers
+    preflight requests directly with a fixed 204, without parsing CORS
+    configuration per request.
+    """
+
+    ALLOW_ORIGIN = (b"access-control-allow-origin", b"*")
+    PREFLIGHT_HEADERS = [
+        ALLOW_ORIGIN,
+        (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+        (b"access-control-max-age", b"600"),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS":
+            request_headers = dict(scope["headers"])
+            if b"access-control-request-method" in request_headers:
+                headers = list(self.PREFLIGHT_HEADERS)
+                requested = request_headers.get(b"access-control-request-headers")
+                if requested:
+                    headers.append((b"access-control-allow-headers", requested))
+                await send({"type": "http.response.start", "status": 204, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), self.ALLOW_ORIGIN]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
 
 app = FastAPI(title="SaaS.ai - No-code Builder API")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(FastCORS)
 
 
 # ---------- Utilities ----------
 
+def utcnow() -> datetime:
+    # Truncate to the millisecond precision BSON stores, so responses built from
+    # a fresh document match what later reads of the same document return
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+
 def oid(obj_id: str) -> ObjectId:
-    try:
-        return ObjectId(obj_id)
-    except Exception:
+    if not _OID_RE.fullmatch(obj_id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
+    return ObjectId(obj_id)
+
+
+def get_db():
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not available")
+    return db
 
 
 def serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
     if not doc:
         return doc
-    doc = dict(doc)
-    if "_id" in doc:
-        doc["id"] = str(doc.pop("_id"))
     # Convert datetimes to isoformat strings
-    for k, v in list(doc.items()):
-        if hasattr(v, "isoformat"):
-            doc[k] = v.isoformat()
-    return doc
+    out = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in doc.items() if k != "_id"}
+    if "_id" in doc:
+        out["id"] = str(doc["_id"])
+    return out
+
+
+def compile_serializer(
+    name: str, model: Type[BaseModel], exclude: Tuple[str, ...] = ()
+) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Generate a serializer specialised to documents written from ``model``.
+
+    Field access and timestamp conversion are inlined for the known keys, so
+    no per-value type probing happens at request time. Optional fields read
+    as None when missing and absent timestamps are omitted. Fields in
+    ``exclude`` (e.g. projected out by the query) are left out of the output.
+    """
+    items = ['"id": str(d["_id"])']
+    for field, info in model.model_fields.items():
+        if field in exclude:
+            continue
+        if info.is_required():
+            items.append(f'"{field}": d["{field}"]')
+        else:
+            items.append(f'"{field}": d.get("{field}")')
+    lines = [f"def {name}(d):", f"    out = {{{', '.join(items)}}}"]
+    for field in ("created_at", "updated_at"):
+        lines += [
+            f'    v = d.get("{field}")',
+            "    if v is not None:",
+            f'        out["{field}"] = v.isoformat()',
+        ]
+    lines.append("    return out")
+    namespace: Dict[str, Any] = {}
+    exec("\n".join(lines) + "\n", namespace)
+    return namespace[name]
+
+
+serialize_prototypeversion = compile_serializer("serialize_prototypeversion", PrototypeVersion)
+serialize_prototypeversion_summary = compile_serializer(
+    "serialize_prototypeversion_summary", PrototypeVersion, exclude=("code",)
+)
 
 
 # ---------- Schemas ----------
@@ -72,6 +177,16 @@ class PrototypeOut(BaseModel):
     created_at: str
 
 
+class PrototypeOutMS(msgspec.Struct):
+    """msgspec mirror of PrototypeOut, used to encode the generate response."""
+    version_id: str
+    idea_id: str
+    version: int
+    site_type: str
+    code: str
+    created_at: str
+
+
 # ---------- Core logic ----------
 
 KEYWORDS = {
@@ -82,9 +197,82 @@ KEYWORDS = {
     "ai": ["ai", "machine learning", "gpt", "model", "chatbot", "assistant"],
 }
 
+# Risk signals scanned alongside the category keywords
+SIGNALS = {
+    "regulated": ["privacy", "health", "finance"],
+    "network": ["viral", "social network"],
+}
 
-def score_idea(text: str) -> ValidateOut:
-    t = text.lower()
+CAT_BIT = {cat: 1 << i for i, cat in enumerate([*KEYWORDS, *SIGNALS])}
+AI_BIT = CAT_BIT["ai"]
+B2B_BIT = CAT_BIT["b2b"]
+COMMERCE_BIT = CAT_BIT["commerce"]
+EDUCATION_BIT = CAT_BIT["education"]
+CONTENT_BIT = CAT_BIT["content"]
+REGULATED_BIT = CAT_BIT["regulated"]
+NETWORK_BIT = CAT_BIT["network"]
+
+
+# Short, ambiguous keywords only count as whole words (plurals allowed), so
+# "ai" no longer matches "aid"; everything else matches anywhere, so
+# "shopping", "chatgpt", "gpt4o" and "healthcare" still count.
+WHOLE_WORD_KEYWORDS = frozenset({"ai", "crm", "erp"})
+_WORD_SUFFIX = r"(?:e?s)?\b"
+_WORD_SUFFIX_RE = re.compile(_WORD_SUFFIX)
+
+
+def _is_whole_word(t: str, start: int, end: int) -> bool:
+    if start and (t[start - 1].isalnum() or t[start - 1] == "_"):
+        return False
+    return _WORD_SUFFIX_RE.match(t, end) is not None
+
+
+def _build_automaton():
+    if ahocorasick is None:
+        return None
+    # Each word maps to (length, whole-word category bits, substring category bits)
+    word_bits: Dict[str, List[int]] = {}
+    for cat, kws in [*KEYWORDS.items(), *SIGNALS.items()]:
+        for kw in kws:
+            entry = word_bits.setdefault(kw, [len(kw), 0, 0])
+            entry[1 if kw in WHOLE_WORD_KEYWORDS else 2] |= CAT_BIT[cat]
+    automaton = ahocorasick.Automaton()
+    for kw, entry in word_bits.items():
+        automaton.add_word(kw, tuple(entry))
+    automaton.make_automaton()
+    return automaton
+
+
+_AC = _build_automaton()
+
+
+def _category_pattern(kws: List[str]) -> re.Pattern:
+    parts = [re.escape(k) for k in kws if k not in WHOLE_WORD_KEYWORDS]
+    whole = [re.escape(k) for k in kws if k in WHOLE_WORD_KEYWORDS]
+    if whole:
+        parts.append(r"\b(?:" + "|".join(whole) + ")" + _WORD_SUFFIX)
+    return re.compile("|".join(parts))
+
+
+# Fallback without pyahocorasick: one C-level regex search per category
+_CAT_RE = {cat: _category_pattern(kws) for cat, kws in [*KEYWORDS.items(), *SIGNALS.items()]}
+
+
+def _match_mask(t: str) -> int:
+    mask = 0
+    if _AC is not None:
+        for end, (size, word_bits, substring_bits) in _AC.iter(t):
+            mask |= substring_bits
+            if word_bits and _is_whole_word(t, end - size + 1, end + 1):
+                mask |= word_bits
+    else:
+        for cat, pattern in _CAT_RE.items():
+            if pattern.search(t) is not None:
+                mask |= CAT_BIT[cat]
+    return mask
+
+
+def _score_from_mask(mask: int) -> Dict[str, int]:
     scores = {
         "market_feasibility": 5,
         "target_audience": 5,
@@ -93,41 +281,53 @@ def score_idea(text: str) -> ValidateOut:
     }
 
     # Heuristic boosts
-    if any(k in t for k in KEYWORDS["ai"]):
+    if mask & AI_BIT:
         scores["market_feasibility"] += 2
         scores["monetization_potential"] += 1
         scores["technical_complexity"] += 2
-    if any(k in t for k in KEYWORDS["b2b"]):
+    if mask & B2B_BIT:
         scores["target_audience"] += 2
         scores["monetization_potential"] += 2
-    if any(k in t for k in KEYWORDS["commerce"]):
+    if mask & COMMERCE_BIT:
         scores["monetization_potential"] += 3
-    if any(k in t for k in KEYWORDS["education"]):
+    if mask & EDUCATION_BIT:
         scores["market_feasibility"] += 1
         scores["target_audience"] += 1
-    if any(k in t for k in KEYWORDS["content"]):
+    if mask & CONTENT_BIT:
         scores["market_feasibility"] += 1
 
     # Clamp 0..10
     for k in scores:
         scores[k] = max(0, min(10, scores[k]))
+    return scores
+
+
+# Scores depend only on the category bits, so every combination is precomputed
+_CATEGORY_MASK = (1 << len(KEYWORDS)) - 1
+_SCORE_TABLE = tuple(_score_from_mask(m) for m in range(_CATEGORY_MASK + 1))
+
+
+def score_idea(text: str) -> ValidateOut:
+    t = text.lower()
+    mask = _match_mask(t)
+    scores = dict(_SCORE_TABLE[mask & _CATEGORY_MASK])
 
     risks = []
     if scores["technical_complexity"] >= 7:
         risks.append("High technical complexity may increase time-to-market and cost.")
-    if "privacy" in t or "health" in t or "finance" in t:
+    if mask & REGULATED_BIT:
         risks.append("Regulatory compliance (privacy/health/finance) may be required.")
-    if "viral" in t or "social network" in t:
+    if mask & NETWORK_BIT:
         risks.append("Network effects are hard to achieve without significant traction.")
 
     opportunities = []
-    if any(k in t for k in KEYWORDS["ai"]):
+    if mask & AI_BIT:
         opportunities.append("Leverage AI differentiation for personalization and automation.")
-    if any(k in t for k in KEYWORDS["b2b"]):
+    if mask & B2B_BIT:
         opportunities.append("B2B sales with clear ROI can support premium pricing.")
-    if any(k in t for k in KEYWORDS["commerce"]):
+    if mask & COMMERCE_BIT:
         opportunities.append("Direct monetization via subscriptions and transactions.")
-    if any(k in t for k in KEYWORDS["education"]):
+    if mask & EDUCATION_BIT:
         opportunities.append("Large educator communities enable organic distribution.")
 
     recommendations = [
@@ -151,235 +351,312 @@ def score_idea(text: str) -> ValidateOut:
     )
 
 
-def generate_code(site_type: str, idea_text: str) -> str:
-    # Tailwind CDN single-file templates with simple components
-    base_head = (
-        "<meta charset='UTF-8'/>"
-        "<meta name='viewport' content='width=device-width, initial-scale=1.0'/>"
-        "<script src='https://cdn.tailwindcss.com'></script>"
-        "<title>SaaS.ai Prototype</title>"
-    )
-    # Simple color theme
-    hero = f"""
-    <header class='bg-gradient-to-br from-slate-900 via-slate-800 to-slate-900 text-white'>
-      <div class='max-w-6xl mx-auto px-6 py-20'>
-        <h1 class='text-4xl md:text-6xl font-extrabold tracking-tight'>Prototype: {site_type.title()}</h1>
-        <p class='mt-4 text-slate-300 text-lg'>Idea: {idea_text}</p>
-        <div class='mt-8 flex gap-3'>
-          <a href='#' class='px-5 py-3 rounded-lg bg-blue-600 hover:bg-blue-500 transition'>Get Started</a>
-          <a href='#' class='px-5 py-3 rounded-lg bg-white/10 hover:bg-white/20 transition'>Learn More</a>
-        </div>
+# Longer texts are scored uncached so the cache cannot pin large request bodies
+MAX_CACHED_IDEA_LEN = 2000
+
+
+@lru_cache(maxsize=4096)
+def _score_idea_cached(text: str) -> Dict[str, Any]:
+    # The returned dict is shared by every hit and must be treated as read-only
+    return score_idea(text).model_dump()
+
+
+# Tailwind CDN single-file templates with simple components
+_BASE_HEAD = (
+    "<meta charset='UTF-8'/>"
+    "<meta name='viewport' content='width=device-width, initial-scale=1.0'/>"
+    "<script src='https://cdn.tailwindcss.com'></script>"
+    "<title>SaaS.ai Prototype</title>"
+)
+
+# Simple color theme
+_HERO_TMPL = """
+<header class='bg-gradient-to-br from-slate-900 via-slate-800 to-slate-900 text-white'>
+  <div class='max-w-6xl mx-auto px-6 py-20'>
+    <h1 class='text-4xl md:text-6xl font-extrabold tracking-tight'>Prototype: {title}</h1>
+    <p class='mt-4 text-slate-300 text-lg'>Idea: {idea}</p>
+    <div class='mt-8 flex gap-3'>
+      <a href='#' class='px-5 py-3 rounded-lg bg-blue-600 hover:bg-blue-500 transition'>Get Started</a>
+      <a href='#' class='px-5 py-3 rounded-lg bg-white/10 hover:bg-white/20 transition'>Learn More</a>
+    </div>
+  </div>
+</header>
+"""
+
+_SECTION_HTML = {
+    "landing": """
+<section class='max-w-6xl mx-auto px-6 py-16 grid md:grid-cols-3 gap-8'>
+  <div class='p-6 rounded-xl border border-slate-200/20 bg-white/5'>
+    <h3 class='text-xl font-semibold text-white'>Problem</h3>
+    <p class='mt-2 text-slate-300'>Describe the pain point your product solves.</p>
+  </div>
+  <div class='p-6 rounded-xl border border-slate-200/20 bg-white/5'>
+    <h3 class='text-xl font-semibold text-white'>Solution</h3>
+    <p class='mt-2 text-slate-300'>Show how you uniquely address the problem.</p>
+  </div>
+  <div class='p-6 rounded-xl border border-slate-200/20 bg-white/5'>
+    <h3 class='text-xl font-semibold text-white'>Proof</h3>
+    <p class='mt-2 text-slate-300'>Add testimonials, metrics, or social proof.</p>
+  </div>
+</section>
+<section class='max-w-6xl mx-auto px-6 pb-20'>
+  <div class='rounded-2xl border border-slate-200/20 bg-white/5 p-6'>
+    <h3 class='text-xl font-semibold text-white'>Call to Action</h3>
+    <div class='mt-4 flex gap-3'>
+      <input placeholder='Email address' class='px-4 py-3 rounded-lg bg-white/10 text-white placeholder-slate-400 outline-none w-full md:w-72'>
+      <button class='px-5 py-3 rounded-lg bg-blue-600 hover:bg-blue-500 transition'>Join Waitlist</button>
+    </div>
+  </div>
+</section>
+""",
+    "dashboard": """
+<section class='max-w-6xl mx-auto px-6 py-16'>
+  <div class='grid md:grid-cols-4 gap-6'>
+    <div class='col-span-4 grid sm:grid-cols-4 gap-4'>
+      <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
+        <p class='text-slate-400 text-sm'>Active Users</p>
+        <p class='text-2xl font-bold text-white'>1,284</p>
       </div>
-    </header>
-    """
+      <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
+        <p class='text-slate-400 text-sm'>MRR</p>
+        <p class='text-2xl font-bold text-white'>$8,920</p>
+      </div>
+      <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
+        <p class='text-slate-400 text-sm'>Churn</p>
+        <p class='text-2xl font-bold text-white'>2.4%</p>
+      </div>
+      <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
+        <p class='text-slate-400 text-sm'>Tickets</p>
+        <p class='text-2xl font-bold text-white'>37</p>
+      </div>
+    </div>
+    <div class='col-span-3 mt-6 rounded-xl bg-white/5 border border-slate-200/20 p-6'>
+      <h3 class='text-white font-semibold'>Usage Over Time</h3>
+      <div class='mt-4 h-48 rounded-lg bg-gradient-to-r from-blue-500/20 to-cyan-500/20'></div>
+    </div>
+    <div class='col-span-1 mt-6 rounded-xl bg-white/5 border border-slate-200/20 p-6'>
+      <h3 class='text-white font-semibold'>Tasks</h3>
+      <ul class='mt-2 space-y-2 text-slate-300'>
+        <li>Follow up with leads</li>
+        <li>Review signups</li>
+        <li>Plan onboarding</li>
+      </ul>
+    </div>
+  </div>
+</section>
+""",
+    "ecommerce": """
+<section class='max-w-6xl mx-auto px-6 py-16'>
+  <div class='grid sm:grid-cols-2 md:grid-cols-3 gap-6'>
+    <div class='rounded-xl overflow-hidden bg-white/5 border border-slate-200/20'>
+      <div class='h-40 bg-gradient-to-br from-blue-400 to-cyan-400'></div>
+      <div class='p-4'>
+        <p class='text-white font-semibold'>Starter Plan</p>
+        <p class='text-slate-300'>$19</p>
+        <button class='mt-3 w-full px-4 py-2 rounded-lg bg-blue-600 hover:bg-blue-500'>Add to Cart</button>
+      </div>
+    </div>
+    <div class='rounded-xl overflow-hidden bg-white/5 border border-slate-200/20'>
+      <div class='h-40 bg-gradient-to-br from-purple-400 to-pink-400'></div>
+      <div class='p-4'>
+        <p class='text-white font-semibold'>Pro Plan</p>
+        <p class='text-slate-300'>$49</p>
+        <button class='mt-3 w-full px-4 py-2 rounded-lg bg-blue-600 hover:bg-blue-500'>Add to Cart</button>
+      </div>
+    </div>
+    <div class='rounded-xl overflow-hidden bg-white/5 border border-slate-200/20'>
+      <div class='h-40 bg-gradient-to-br from-emerald-400 to-teal-400'></div>
+      <div class='p-4'>
+        <p class='text-white font-semibold'>Enterprise</p>
+        <p class='text-slate-300'>$199</p>
+        <button class='mt-3 w-full px-4 py-2 rounded-lg bg-blue-600 hover:bg-blue-500'>Contact Sales</button>
+      </div>
+    </div>
+  </div>
+</section>
+""",
+    "blog": """
+<section class='max-w-3xl mx-auto px-6 py-16'>
+  <article class='prose prose-invert'>
+    <h2>Introducing Our New Prototype</h2>
+    <p>This is a minimal blog layout generated for your idea. Replace this text with your own content and publish.</p>
+    <h3>Why it matters</h3>
+    <ul>
+      <li>Fast to iterate</li>
+      <li>Simple to customize</li>
+      <li>Clean, modern design</li>
+    </ul>
+  </article>
+  <div class='mt-10 grid gap-6 sm:grid-cols-2'>
+    <a class='p-4 rounded-xl bg-white/5 border border-slate-200/20 block'>How we validate product ideas</a>
+    <a class='p-4 rounded-xl bg-white/5 border border-slate-200/20 block'>Designing dashboards that delight</a>
+  </div>
+</section>
+""",
+}
+_SECTION_HTML_DEFAULT = _SECTION_HTML["landing"]
+
+_PAGE_TMPL = (
+    "<!doctype html><html><head>" + _BASE_HEAD + "</head>"
+    "<body class='min-h-screen bg-slate-950'>"
+    + _HERO_TMPL
+    + "{section}"
+    "<footer class='py-10 text-center text-slate-400'>Built with SaaS.ai</footer>"
+    "</body></html>"
+)
 
-    sections = {
-        "landing": """
-        <section class='max-w-6xl mx-auto px-6 py-16 grid md:grid-cols-3 gap-8'>
-          <div class='p-6 rounded-xl border border-slate-200/20 bg-white/5'>
-            <h3 class='text-xl font-semibold text-white'>Problem</h3>
-            <p class='mt-2 text-slate-300'>Describe the pain point your product solves.</p>
-          </div>
-          <div class='p-6 rounded-xl border border-slate-200/20 bg-white/5'>
-            <h3 class='text-xl font-semibold text-white'>Solution</h3>
-            <p class='mt-2 text-slate-300'>Show how you uniquely address the problem.</p>
-          </div>
-          <div class='p-6 rounded-xl border border-slate-200/20 bg-white/5'>
-            <h3 class='text-xl font-semibold text-white'>Proof</h3>
-            <p class='mt-2 text-slate-300'>Add testimonials, metrics, or social proof.</p>
-          </div>
-        </section>
-        <section class='max-w-6xl mx-auto px-6 pb-20'>
-          <div class='rounded-2xl border border-slate-200/20 bg-white/5 p-6'>
-            <h3 class='text-xl font-semibold text-white'>Call to Action</h3>
-            <div class='mt-4 flex gap-3'>
-              <input placeholder='Email address' class='px-4 py-3 rounded-lg bg-white/10 text-white placeholder-slate-400 outline-none w-full md:w-72'>
-              <button class='px-5 py-3 rounded-lg bg-blue-600 hover:bg-blue-500 transition'>Join Waitlist</button>
-            </div>
-          </div>
-        </section>
-        """,
-        "dashboard": """
-        <section class='max-w-6xl mx-auto px-6 py-16'>
-          <div class='grid md:grid-cols-4 gap-6'>
-            <div class='col-span-4 grid sm:grid-cols-4 gap-4'>
-              <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
-                <p class='text-slate-400 text-sm'>Active Users</p>
-                <p class='text-2xl font-bold text-white'>1,284</p>
-              </div>
-              <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
-                <p class='text-slate-400 text-sm'>MRR</p>
-                <p class='text-2xl font-bold text-white'>$8,920</p>
-              </div>
-              <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
-                <p class='text-slate-400 text-sm'>Churn</p>
-                <p class='text-2xl font-bold text-white'>2.4%</p>
-              </div>
-              <div class='p-4 rounded-xl bg-white/5 border border-slate-200/20'>
-                <p class='text-slate-400 text-sm'>Tickets</p>
-                <p class='text-2xl font-bold text-white'>37</p>
-              </div>
-            </div>
-            <div class='col-span-3 mt-6 rounded-xl bg-white/5 border border-slate-200/20 p-6'>
-              <h3 class='text-white font-semibold'>Usage Over Time</h3>
-              <div class='mt-4 h-48 rounded-lg bg-gradient-to-r from-blue-500/20 to-cyan-500/20'></div>
-            </div>
-            <div class='col-span-1 mt-6 rounded-xl bg-white/5 border border-slate-200/20 p-6'>
-              <h3 class='text-white font-semibold'>Tasks</h3>
-              <ul class='mt-2 space-y-2 text-slate-300'>
-                <li>Follow up with leads</li>
-                <li>Review signups</li>
-                <li>Plan onboarding</li>
-              </ul>
-            </div>
-          </div>
-        </section>
-        """,
-        "ecommerce": """
-        <section class='max-w-6xl mx-auto px-6 py-16'>
-          <div class='grid sm:grid-cols-2 md:grid-cols-3 gap-6'>
-            <div class='rounded-xl overflow-hidden bg-white/5 border border-slate-200/20'>
-              <div class='h-40 bg-gradient-to-br from-blue-400 to-cyan-400'></div>
-              <div class='p-4'>
-                <p class='text-white font-semibold'>Starter Plan</p>
-                <p class='text-slate-300'>$19</p>
-                <button class='mt-3 w-full px-4 py-2 rounded-lg bg-blue-600 hover:bg-blue-500'>Add to Cart</button>
-              </div>
-            </div>
-            <div class='rounded-xl overflow-hidden bg-white/5 border border-slate-200/20'>
-              <div class='h-40 bg-gradient-to-br from-purple-400 to-pink-400'></div>
-              <div class='p-4'>
-                <p class='text-white font-semibold'>Pro Plan</p>
-                <p class='text-slate-300'>$49</p>
-                <button class='mt-3 w-full px-4 py-2 rounded-lg bg-blue-600 hover:bg-blue-500'>Add to Cart</button>
-              </div>
-            </div>
-            <div class='rounded-xl overflow-hidden bg-white/5 border border-slate-200/20'>
-              <div class='h-40 bg-gradient-to-br from-emerald-400 to-teal-400'></div>
-              <div class='p-4'>
-                <p class='text-white font-semibold'>Enterprise</p>
-                <p class='text-slate-300'>$199</p>
-                <button class='mt-3 w-full px-4 py-2 rounded-lg bg-blue-600 hover:bg-blue-500'>Contact Sales</button>
-              </div>
-            </div>
-          </div>
-        </section>
-        """,
-        "blog": """
-        <section class='max-w-3xl mx-auto px-6 py-16'>
-          <article class='prose prose-invert'>
-            <h2>Introducing Our New Prototype</h2>
-            <p>This is a minimal blog layout generated for your idea. Replace this text with your own content and publish.</p>
-            <h3>Why it matters</h3>
-            <ul>
-              <li>Fast to iterate</li>
-              <li>Simple to customize</li>
-              <li>Clean, modern design</li>
-            </ul>
-          </article>
-          <div class='mt-10 grid gap-6 sm:grid-cols-2'>
-            <a class='p-4 rounded-xl bg-white/5 border border-slate-200/20 block'>How we validate product ideas</a>
-            <a class='p-4 rounded-xl bg-white/5 border border-slate-200/20 block'>Designing dashboards that delight</a>
-          </div>
-        </section>
-        """,
-    }
 
-    body = f"""
-    <!doctype html>
-    <html>
-      <head>{base_head}</head>
-      <body class='min-h-screen bg-slate-950'>
-        {hero}
-        {sections.get(site_type, sections['landing'])}
-        <footer class='py-10 text-center text-slate-400'>Built with SaaS.ai</footer>
-      </body>
-    </html>
-    """
-    return body
+def _page_parts(site_type: str) -> Tuple[str, str]:
+    page = _PAGE_TMPL.format(
+        title=site_type.title(),
+        idea="{idea}",
+        section=_SECTION_HTML.get(site_type, _SECTION_HTML_DEFAULT),
+    )
+    before, _, after = page.partition("{idea}")
+    return before, after
+
+
+# Only the idea text varies per request, so each page is pre-rendered around it
+_PAGE_PARTS = {site_type: _page_parts(site_type) for site_type in _SECTION_HTML}
+
+
+def generate_code(site_type: str, idea_text: str) -> str:
+    before, after = _PAGE_PARTS.get(site_type) or _page_parts(site_type)
+    return before + html.escape(idea_text) + after
 
 
 # ---------- Routes ----------
 
+@app.on_event("startup")
+async def create_indexes():
+    # Run in the background: an unreachable database would otherwise hold up
+    # booting for the whole server-selection timeout; /test reports it instead
+    task = asyncio.create_task(ensure_indexes())
+    _startup_tasks.add(task)
+    task.add_done_callback(_log_startup_task_result)
+
+
+_startup_tasks = set()
+
+
+def _log_startup_task_result(task: "asyncio.Task[None]") -> None:
+    _startup_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Could not create indexes or seed version counters", exc_info=task.exception())
+
+
 @app.get("/")
 def root():
     return {"message": "SaaS.ai API is running"}
 
 
 @app.post("/api/ideas")
-def create_idea(idea: IdeaIn):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
+async def create_idea(idea: IdeaIn, db=Depends(get_db)):
+    now = utcnow()
     doc = {
         "text": idea.text,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
     }
-    inserted_id = db["idea"].insert_one(doc).inserted_id
+    inserted_id = (await db["idea"].insert_one(doc)).inserted_id
     return {"idea_id": str(inserted_id)}
 
 
 @app.get("/api/ideas/{idea_id}")
-def get_idea(idea_id: str):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-    doc = db["idea"].find_one({"_id": oid(idea_id)})
+async def get_idea(idea_id: str, db=Depends(get_db)):
+    doc = await db["idea"].find_one({"_id": oid(idea_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="Idea not found")
     return serialize(doc)
 
 
 @app.get("/api/ideas/{idea_id}/versions")
-def list_versions(idea_id: str):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-    cur = db["prototypeversion"].find({"idea_id": idea_id}).sort("version", -1)
-    items = [serialize(d) for d in cur]
-    return {"count": len(items), "items": items}
+async def list_versions(idea_id: str, db=Depends(get_db)):
+    # The generated code is multi-KB and only served by get_version
+    cur = db["prototypeversion"].find({"idea_id": idea_id}, projection={"code": 0}).sort("version", -1)
+    # Fetch the first document before the 200 goes out, so connection errors
+    # still surface as a 500
+    try:
+        first = await cur.next()
+    except StopAsyncIteration:
+        first = None
+
+    async def docs():
+        if first is not None:
+            yield first
+            async for d in cur:
+                yield d
+
+    async def gen():
+        # Stream items as they come off the cursor; count is emitted last
+        yield b'{"items":['
+        count = 0
+        try:
+            async for d in docs():
+                try:
+                    item = orjson.dumps(serialize_prototypeversion_summary(d))
+                except KeyError:
+                    logger.exception("Skipping malformed prototype version %s", d.get("_id"))
+                    continue
+                yield b"," + item if count else item
+                count += 1
+        except Exception:
+            # Status and the opening bracket are already sent; keep the body valid JSON
+            logger.exception("Version listing for idea %s ended early", idea_id)
+        yield b'],"count":%d}' % count
+
+    return StreamingResponse(gen(), media_type="application/json")
 
 
 @app.get("/api/versions/{version_id}")
-def get_version(version_id: str):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-    doc = db["prototypeversion"].find_one({"_id": oid(version_id)})
+async def get_version(version_id: str, db=Depends(get_db)):
+    doc = await db["prototypeversion"].find_one({"_id": oid(version_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="Version not found")
-    return serialize(doc)
+    return serialize_prototypeversion(doc)
 
 
-@app.post("/api/validate", response_model=ValidateOut)
+@app.post("/api/validate", responses={200: {"model": ValidateOut}})
 def validate_idea(idea: IdeaIn):
-    return score_idea(idea.text)
+    text = idea.text
+    if len(text) <= MAX_CACHED_IDEA_LEN:
+        result = _score_idea_cached(text)
+    else:
+        result = score_idea(text).model_dump()
+    # Encode directly; score_idea output needs no response-model re-validation
+    return Response(content=orjson.dumps(result), media_type="application/json")
 
 
-@app.post("/api/generate", response_model=PrototypeOut)
-def generate_prototype(payload: GenerateIn):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
+@app.post("/api/generate", responses={200: {"model": PrototypeOut}})
+async def generate_prototype(payload: GenerateIn, db=Depends(get_db)):
+    now = utcnow()
 
     # Ensure idea exists or create from text
     idea_id = payload.idea_id
     if not idea_id:
         if not payload.text:
             raise HTTPException(status_code=400, detail="Provide idea_id or text")
-        idea_id = str(db["idea"].insert_one({
+        result = await db["idea"].insert_one({
             "text": payload.text,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-        }).inserted_id)
+            "created_at": now,
+            "updated_at": now,
+        })
+        idea_id = str(result.inserted_id)
         idea_text = payload.text
     else:
-        idea_doc = db["idea"].find_one({"_id": oid(idea_id)})
+        idea_doc = await db["idea"].find_one({"_id": oid(idea_id)}, projection={"text": 1})
         if not idea_doc:
             raise HTTPException(status_code=404, detail="Idea not found")
         idea_text = idea_doc.get("text", payload.text or "")
 
-    # Determine next version
-    last = db["prototypeversion"].find({"idea_id": idea_id}).sort("version", -1).limit(1)
-    next_version = 1
-    for d in last:
-        next_version = int(d.get("version", 0)) + 1
+    # Determine next version atomically from the per-idea counter (seeded at startup)
+    counter = await db["version_counter"].find_one_and_update(
+        {"_id": idea_id},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    next_version = counter["seq"]
 
     code = generate_code(payload.site_type, idea_text)
 
@@ -390,25 +667,27 @@ def generate_prototype(payload: GenerateIn):
         "version": next_version,
         "code": code,
         "notes": payload.notes,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
     }
-    inserted_id = db["prototypeversion"].insert_one(doc).inserted_id
-    saved = db["prototypeversion"].find_one({"_id": inserted_id})
+    inserted_id = (await db["prototypeversion"].insert_one(doc)).inserted_id
+    doc["_id"] = inserted_id
 
-    s = serialize(saved)
-    return PrototypeOut(
+    s = serialize_prototypeversion(doc)
+    out = PrototypeOutMS(
         version_id=s["id"],
         idea_id=s["idea_id"],
         version=s["version"],
         site_type=s["site_type"],
         code=s["code"],
-        created_at=s.get("created_at", ""),
+        created_at=s["created_at"],
     )
+    # Encode directly; the multi-KB code field makes Pydantic + json.dumps costly
+    return Response(content=msgspec.json.encode(out), media_type="application/json")
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -424,7 +703,7 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -439,7 +718,30 @@ def test_database():
     return response
 
 
+def _supports_io_uring() -> bool:
+    # uringcore needs Linux 5.11+ (IORING_OP_PROVIDE_BUFFERS)
+    if platform.system() != "Linux":
+        return False
+    try:
+        major, minor = (int(p) for p in platform.release().split("-")[0].split(".")[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (5, 11)
+
+
 if __name__ == "__main__":
     import uvicorn
+
+    loop = "auto"
+    if _supports_io_uring():
+        try:
+            import uringcore
+        except ImportError:
+            pass
+        else:
+            asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+            # "auto" would swap in uvloop's policy over ours
+            loop = "asyncio"
+
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, loop=loop)
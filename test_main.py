@@ -0,0 +1,47 @@
+import pytest
+
+import main
+
+CASES = [
+    # (text, categories expected to match)
+    ("An AI chatbot for teachers", {"ai", "education"}),
+    ("aid for the needy", set()),
+    ("email marketing to maintain leads", set()),
+    ("chatgpt app", {"ai"}),
+    ("gpt-4 powered assistant", {"ai"}),
+    ("gpt4 assistant", {"ai"}),
+    ("gpt4o app", {"ai"}),
+    ("AIs that write code", {"ai"}),
+    ("online shopping", {"commerce"}),
+    ("selling stuff", {"commerce"}),
+    ("storefront builder", {"commerce"}),
+    ("blogging platform", {"content"}),
+    ("classroom tool", {"education"}),
+    ("crm for teams", {"b2b"}),
+    ("a scrm tool", set()),
+    ("healthcare privacy", {"regulated"}),
+    ("viral social network", {"network"}),
+    ("", set()),
+]
+
+
+def _mask(categories):
+    mask = 0
+    for cat in categories:
+        mask |= main.CAT_BIT[cat]
+    return mask
+
+
+@pytest.mark.parametrize("text,categories", CASES)
+def test_regex_fallback_matches_expected_categories(monkeypatch, text, categories):
+    monkeypatch.setattr(main, "_AC", None)
+    assert main._match_mask(text.lower()) == _mask(categories)
+
+
+@pytest.mark.skipif(main._AC is None, reason="pyahocorasick not installed")
+@pytest.mark.parametrize("text,categories", CASES)
+def test_automaton_agrees_with_regex_fallback(monkeypatch, text, categories):
+    t = text.lower()
+    automaton_mask = main._match_mask(t)
+    monkeypatch.setattr(main, "_AC", None)
+    assert automaton_mask == main._match_mask(t) == _mask(categories)